@@ -12,6 +12,8 @@ import torch
 from torch import nn
 from torchvision import models, transforms
 
+from tta import build_tta_transforms, is_non_cattle
+
 
 # Prefer DirectML (AMD on Windows) > CUDA > CPU
 try:
@@ -123,28 +125,7 @@ def _predict_pil(image: Image.Image, top_k: int = 3) -> List[Dict]:
 	image = image.convert("RGB")
 
 	# Light TTA to stabilize predictions and measure uncertainty
-	tta_transforms = [
-		transforms.Compose([
-			transforms.Resize(int(_IMAGE_SIZE * 1.15)),
-			transforms.CenterCrop(_IMAGE_SIZE),
-			transforms.ToTensor(),
-			transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-		]),
-		transforms.Compose([
-			transforms.Resize(int(_IMAGE_SIZE * 1.15)),
-			transforms.CenterCrop(_IMAGE_SIZE),
-			transforms.RandomHorizontalFlip(p=1.0),
-			transforms.ToTensor(),
-			transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-		]),
-		transforms.Compose([
-			transforms.Resize(int(_IMAGE_SIZE * 1.15)),
-			transforms.CenterCrop(_IMAGE_SIZE),
-			transforms.ColorJitter(brightness=0.1, contrast=0.1),
-			transforms.ToTensor(),
-			transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-		]),
-	]
+	tta_transforms = build_tta_transforms(_IMAGE_SIZE)
 
 	probs_list = []
 	with torch.no_grad():
@@ -168,9 +149,7 @@ def _predict_pil(image: Image.Image, top_k: int = 3) -> List[Dict]:
 	margin = best_prob - second_prob
 	ent = _entropy(probs)
 
-	# Heuristics tuned for open-set rejection
-	is_non_cattle = (best_prob < 0.6) or (margin < 0.25) or (ent > 1.5)
-	if is_non_cattle:
+	if is_non_cattle(best_prob, margin, ent):
 		return [{"label": "Not a cow or buffalo", "probability": 0.9}]
 
 	return [ {"label": l, "probability": p} for l, p in label_probs[:top_k] ]
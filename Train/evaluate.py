@@ -0,0 +1,300 @@
+import os
+import json
+import math
+import argparse
+import itertools
+from typing import Dict, List, Tuple
+
+import torch
+from torch.utils.data import DataLoader, Dataset
+from torchvision import transforms
+from PIL import Image
+from tqdm import tqdm
+
+from infer import load_model, _DEVICE, CHECKPOINTS_DIR, ARTIFACTS_DIR
+from tta import TTA_VIEW_NAMES, MIN_PROB, MIN_MARGIN, MAX_ENTROPY, build_tta_transforms
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".avif")
+
+# Configuration used by api._predict_pil
+CURRENT_CONFIG = {"views": TTA_VIEW_NAMES, "temperature": 1.0, "min_prob": MIN_PROB, "min_margin": MIN_MARGIN, "max_entropy": MAX_ENTROPY}
+
+
+class MultiViewDataset(Dataset):
+	"""Returns every TTA view of an image stacked as [V, 3, H, W]."""
+
+	def __init__(self, samples: List[Tuple[str, int]], view_transforms: List[transforms.Compose]):
+		self.samples = samples
+		self.view_transforms = view_transforms
+
+	def __len__(self) -> int:
+		return len(self.samples)
+
+	def __getitem__(self, index: int):
+		path, target = self.samples[index]
+		image = Image.open(path).convert("RGB")
+		views = torch.stack([tform(image) for tform in self.view_transforms], dim=0)
+		return views, target
+
+
+def _list_images(root: str) -> List[str]:
+	paths = []
+	for dirpath, _, filenames in os.walk(root):
+		for name in filenames:
+			if name.lower().endswith(IMAGE_EXTENSIONS):
+				paths.append(os.path.join(dirpath, name))
+	return sorted(paths)
+
+
+def collect_samples(labeled_dir: str, negative_dir: str, idx_to_class: Dict[str, str]) -> List[Tuple[str, int]]:
+	"""Labeled images get their class index (one sub-folder per breed), negatives get -1."""
+	class_to_idx = {name: int(idx) for idx, name in idx_to_class.items()}
+	samples: List[Tuple[str, int]] = []
+	for class_name in sorted(os.listdir(labeled_dir)):
+		class_dir = os.path.join(labeled_dir, class_name)
+		if not os.path.isdir(class_dir):
+			continue
+		if class_name not in class_to_idx:
+			raise ValueError(f"Folder '{class_name}' in {labeled_dir} is not a class known to the model.")
+		samples.extend((p, class_to_idx[class_name]) for p in _list_images(class_dir))
+	if negative_dir:
+		samples.extend((p, -1) for p in _list_images(negative_dir))
+	return samples
+
+
+def cache_source(ckpt_path: str, labeled_dir: str, negative_dir: str) -> Dict:
+	"""Identifies the model and data a logits cache was computed from."""
+	return {
+		"ckpt_path": os.path.abspath(ckpt_path),
+		"ckpt_mtime": os.path.getmtime(ckpt_path) if os.path.exists(ckpt_path) else None,
+		"labeled_dir": os.path.abspath(labeled_dir),
+		"negative_dir": os.path.abspath(negative_dir) if negative_dir else "",
+	}
+
+
+def stale_cache_reasons(cache: Dict, ckpt_path: str, labeled_dir: str, negative_dir: str) -> List[str]:
+	"""Lists what differs between a logits cache and the current checkpoint, images and TTA views."""
+	reasons = [key for key, value in cache_source(ckpt_path, labeled_dir, negative_dir).items() if cache.get("source", {}).get(key) != value]
+	if cache.get("views") != TTA_VIEW_NAMES:
+		reasons.append("views")
+	with open(os.path.join(ARTIFACTS_DIR, "idx_to_class.json"), "r", encoding="utf-8") as f:
+		idx_to_class: Dict[str, str] = json.load(f)
+	if cache.get("idx_to_class") != idx_to_class:
+		reasons.append("idx_to_class")
+	if os.path.exists(ckpt_path) and cache.get("image_size") != torch.load(ckpt_path, map_location="cpu").get("image_size", 224):
+		reasons.append("image_size")
+	# Only a directory walk, catches images added, removed or moved between breed folders
+	samples = collect_samples(labeled_dir, negative_dir, idx_to_class)
+	cached = list(zip(cache.get("paths", []), cache["targets"].tolist() if "targets" in cache else []))
+	if [(os.path.abspath(p), t) for p, t in samples] != [(os.path.abspath(p), t) for p, t in cached]:
+		reasons.append("images")
+	return reasons
+
+
+def compute_logits(ckpt_path: str, labeled_dir: str, negative_dir: str, batch_size: int = 32, num_workers: int = 2, seed: int = 0) -> Dict:
+	"""Runs the model once over every view of every image and returns the per-view logits."""
+	torch.manual_seed(seed)  # the jitter view is random, keep the cache reproducible
+	model, idx_to_class, image_size = load_model(ckpt_path)
+	samples = collect_samples(labeled_dir, negative_dir, idx_to_class)
+	if not samples:
+		raise ValueError("No images found to evaluate.")
+	dataset = MultiViewDataset(samples, build_tta_transforms(image_size))
+	loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+
+	all_logits = []
+	with torch.no_grad():
+		for views, _ in tqdm(loader, desc="Computing logits", leave=False):
+			b, v = views.shape[:2]
+			logits = model(views.flatten(0, 1).to(_DEVICE))
+			all_logits.append(logits.view(b, v, -1).float().cpu())
+
+	return {
+		"logits": torch.cat(all_logits, dim=0),  # [N, V, C]
+		"targets": torch.tensor([t for _, t in samples], dtype=torch.long),  # [N], -1 = not cattle
+		"paths": [p for p, _ in samples],
+		"views": TTA_VIEW_NAMES,
+		"idx_to_class": idx_to_class,
+		"image_size": image_size,
+		"source": cache_source(ckpt_path, labeled_dir, negative_dir),
+	}
+
+
+def _view_subsets(num_views: int) -> torch.Tensor:
+	"""All non-empty subsets of views as a 0/1 mask of shape [K, V]."""
+	masks = [m for m in itertools.product([0.0, 1.0], repeat=num_views) if any(m)]
+	return torch.tensor(masks)
+
+
+def _expected_calibration_error(confidence: torch.Tensor, correct: torch.Tensor, num_bins: int = 15) -> torch.Tensor:
+	"""ECE over the last dim; leading dims are independent configurations."""
+	bins = (confidence * num_bins).ceil().long().clamp(1, num_bins) - 1
+	one_hot = torch.nn.functional.one_hot(bins, num_bins).float()  # [..., N, B]
+	conf_sum = (one_hot * confidence.unsqueeze(-1)).sum(-2)
+	acc_sum = (one_hot * correct.float().unsqueeze(-1)).sum(-2)
+	gap = (conf_sum - acc_sum).abs()
+	return gap.sum(-1) / confidence.shape[-1]
+
+
+def sweep(cache: Dict, temperatures: List[float], min_probs: List[float], min_margins: List[float], max_entropies: List[float]) -> List[Dict]:
+	"""Scores every (view subset, temperature, thresholds) combination from cached logits."""
+	logits = cache["logits"]
+	targets = cache["targets"]
+	views = cache["views"]
+	is_labeled = targets >= 0
+	num_labeled = int(is_labeled.sum())
+	num_negative = int((~is_labeled).sum())
+	if num_labeled == 0:
+		raise ValueError("No labeled images to evaluate.")
+
+	subsets = _view_subsets(len(views))  # [K, V]
+	temps = torch.tensor(temperatures)  # [T]
+
+	# Per-view probabilities for every temperature, then averaged over each view subset (as the API does)
+	view_probs = torch.softmax(logits.unsqueeze(0) / temps.view(-1, 1, 1, 1), dim=-1)  # [T, N, V, C]
+	probs = torch.einsum("tnvc,kv->tknc", view_probs, subsets.to(view_probs)) / subsets.sum(1).view(1, -1, 1, 1)  # [T, K, N, C]
+
+	top2 = probs.topk(2, dim=-1).values
+	best = top2[..., 0]
+	margin = top2[..., 0] - top2[..., 1]
+	entropy = -(probs.clamp(min=1e-9) * probs.clamp(min=1e-9).log()).sum(-1)
+	correct = probs.argmax(-1) == targets  # negatives never match
+
+	ece = _expected_calibration_error(best[..., is_labeled], correct[..., is_labeled])  # [T, K]
+	plain_acc = correct[..., is_labeled].float().mean(-1)  # [T, K]
+
+	p_thr = torch.tensor(min_probs, dtype=best.dtype).view(1, -1, 1, 1)
+	m_thr = torch.tensor(min_margins, dtype=best.dtype).view(1, 1, -1, 1)
+	e_thr = torch.tensor(max_entropies, dtype=best.dtype).view(1, 1, 1, -1)
+
+	results: List[Dict] = []
+	for t, k in itertools.product(range(len(temperatures)), range(subsets.shape[0])):
+		# [N, P, M, E]: vectorized tta.is_non_cattle, the rule used by api._predict_pil
+		reject = (best[t, k].view(-1, 1, 1, 1) < p_thr) | (margin[t, k].view(-1, 1, 1, 1) < m_thr) | (entropy[t, k].view(-1, 1, 1, 1) > e_thr)
+		accept = ~reject
+		lab_accept = accept[is_labeled]
+		lab_correct = correct[t, k][is_labeled].view(-1, 1, 1, 1)
+		accepted = lab_accept.sum(0).float()
+		accepted_correct = (lab_accept & lab_correct).sum(0).float()
+		neg_rejected = reject[~is_labeled].sum(0).float()
+		# Open-set accuracy: a breed image counts if accepted and right, a negative counts if rejected
+		open_set_acc = (accepted_correct + neg_rejected) / max(num_labeled + num_negative, 1)
+		selective_acc = accepted_correct / accepted.clamp(min=1)
+		false_reject = 1.0 - accepted / max(num_labeled, 1)
+		neg_reject = neg_rejected / max(num_negative, 1)
+
+		view_names = [views[v] for v in range(len(views)) if subsets[k, v] > 0]
+		for p, m, e in itertools.product(range(len(min_probs)), range(len(min_margins)), range(len(max_entropies))):
+			results.append({
+				"views": view_names,
+				"forward_passes": len(view_names),
+				"temperature": temperatures[t],
+				"min_prob": min_probs[p],
+				"min_margin": min_margins[m],
+				"max_entropy": None if math.isinf(max_entropies[e]) else max_entropies[e],  # None = entropy check off
+				"open_set_accuracy": float(open_set_acc[p, m, e]),
+				"selective_accuracy": float(selective_acc[p, m, e]),
+				"false_reject_rate": float(false_reject[p, m, e]),
+				"negative_reject_rate": float(neg_reject[p, m, e]) if num_negative else None,
+				"plain_accuracy": float(plain_acc[t, k]),
+				"ece": float(ece[t, k]),
+			})
+	return results
+
+
+def _is_config(result: Dict, config: Dict) -> bool:
+	return all(result[key] == config[key] for key in ("temperature", "min_prob", "min_margin", "max_entropy")) and result["views"] == config["views"]
+
+
+def _format_row(r: Dict) -> str:
+	neg = f"{r['negative_reject_rate']*100:6.2f}%" if r["negative_reject_rate"] is not None else "    n/a"
+	max_entropy = r["max_entropy"] if r["max_entropy"] is not None else "off"
+	return (f"{'+'.join(r['views']):<20} passes={r['forward_passes']} T={r['temperature']:<4} "
+		f"p>={r['min_prob']:<5} m>={r['min_margin']:<5} H<={max_entropy:<5} "
+		f"open_acc={r['open_set_accuracy']*100:6.2f}% sel_acc={r['selective_accuracy']*100:6.2f}% "
+		f"false_rej={r['false_reject_rate']*100:6.2f}% neg_rej={neg} ece={r['ece']:.4f}")
+
+
+def _parse_floats(text: str) -> List[float]:
+	return [float(x) for x in text.split(",") if x.strip()]
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Evaluate TTA / temperature / open-set thresholds from cached logits")
+	parser.add_argument("--labeled", type=str, required=True, help="Held-out folder with one sub-folder per breed (not the training Dataset/)")
+	parser.add_argument("--negatives", type=str, default="", help="Folder of non-cattle images (searched recursively)")
+	parser.add_argument("--ckpt", type=str, default=os.path.join(CHECKPOINTS_DIR, "best_model.pt"))
+	parser.add_argument("--cache", type=str, default=os.path.join(ARTIFACTS_DIR, "eval_logits.pt"))
+	parser.add_argument("--recompute", action="store_true", help="Ignore an existing cache and run the model again")
+	parser.add_argument("--batch-size", type=int, default=32)
+	parser.add_argument("--num-workers", type=int, default=2)
+	parser.add_argument("--temperatures", type=str, default="0.5,0.75,1.0,1.25,1.5,2.0,3.0")
+	parser.add_argument("--min-probs", type=str, default="0.0,0.3,0.4,0.5,0.6,0.7,0.8,0.9")
+	parser.add_argument("--min-margins", type=str, default="0.0,0.05,0.1,0.15,0.25,0.35,0.5")
+	parser.add_argument("--max-entropies", type=str, default="0.5,0.75,1.0,1.25,1.5,2.0,inf")
+	parser.add_argument("--target-acc", type=float, default=0.9, help="Required open-set accuracy")
+	parser.add_argument("--min-neg-reject", type=float, default=0.9, help="Required rejection rate on the non-cattle images")
+	parser.add_argument("--top", type=int, default=10, help="Number of configurations to print")
+	parser.add_argument("--report", type=str, default=os.path.join(ARTIFACTS_DIR, "eval_sweep.json"))
+	args = parser.parse_args()
+	temperatures = _parse_floats(args.temperatures)
+	if not all(0 < t < math.inf for t in temperatures):
+		parser.error(f"--temperatures must all be positive and finite, got {args.temperatures}")
+
+	cache = None
+	if os.path.exists(args.cache) and not args.recompute:
+		cache = torch.load(args.cache, map_location="cpu")
+		stale = stale_cache_reasons(cache, args.ckpt, args.labeled, args.negatives)
+		if stale:
+			print(f"Cached logits in {args.cache} do not match the current run ({', '.join(stale)} changed), recomputing")
+			cache = None
+		else:
+			print(f"Loaded cached logits from {args.cache} ({cache['logits'].shape[0]} images)")
+	if cache is None:
+		cache = compute_logits(args.ckpt, args.labeled, args.negatives, args.batch_size, args.num_workers)
+		os.makedirs(os.path.dirname(args.cache) or ".", exist_ok=True)
+		torch.save(cache, args.cache)
+		print(f"Saved logits to {args.cache} ({cache['logits'].shape[0]} images)")
+
+	# The current API thresholds are always part of the sweep so they can be compared
+	temperatures = sorted(set(temperatures) | {CURRENT_CONFIG["temperature"]})
+	min_probs = sorted(set(_parse_floats(args.min_probs)) | {CURRENT_CONFIG["min_prob"]})
+	min_margins = sorted(set(_parse_floats(args.min_margins)) | {CURRENT_CONFIG["min_margin"]})
+	max_entropies = sorted(set(_parse_floats(args.max_entropies)) | {CURRENT_CONFIG["max_entropy"]})
+	results = sweep(cache, temperatures, min_probs, min_margins, max_entropies)
+
+	current = next((r for r in results if _is_config(r, CURRENT_CONFIG)), None)
+	if current is None:
+		raise ValueError(f"The current API configuration is not part of the sweep: cached views {cache['views']} do not match {TTA_VIEW_NAMES}. Re-run with --recompute.")
+	print("Current API configuration:")
+	print(f"  {_format_row(current)}")
+
+	# Cheapest first, then most accurate
+	meeting: List[Dict] = []
+	if current["negative_reject_rate"] is None:
+		# Without negatives only rejections are penalised, so the sweep would always favour turning the open-set check off
+		print("No non-cattle images were evaluated (--negatives), so no configuration is recommended. Best found:")
+	else:
+		meeting = [r for r in results if r["open_set_accuracy"] >= args.target_acc and r["negative_reject_rate"] >= args.min_neg_reject]
+		meeting.sort(key=lambda r: (r["forward_passes"], -r["open_set_accuracy"], r["ece"]))
+		target = f"open-set accuracy >= {args.target_acc*100:.1f}% and negative rejection >= {args.min_neg_reject*100:.1f}%"
+		if meeting:
+			print(f"Cheapest configurations with {target}:")
+		else:
+			print(f"No configuration reaches {target}. Best found:")
+	for r in meeting[:args.top] or sorted(results, key=lambda r: -r["open_set_accuracy"])[:args.top]:
+		print(f"  {_format_row(r)}")
+
+	os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+	with open(args.report, "w", encoding="utf-8") as f:
+		json.dump({
+			"target_accuracy": args.target_acc,
+			"min_negative_reject_rate": args.min_neg_reject,
+			"current": current,
+			"recommended": meeting[0] if meeting else None,
+			"results": results,
+		}, f, indent=2, allow_nan=False)
+	print(f"Wrote full sweep to {args.report}")
+
+
+if __name__ == "__main__":
+	main()
@@ -8,6 +8,8 @@ from torch import nn
 from torchvision import models, transforms
 from PIL import Image
 
+from tta import build_tta_transforms
+
 # Prefer DirectML (AMD on Windows) > CUDA > CPU
 try:
 	import torch_directml  # type: ignore
@@ -50,28 +52,7 @@ def predict(image_path: str, ckpt_path: str, use_tta: bool = True):
 	])
 	
 	# TTA transforms for robustness
-	tta_transforms = [
-		transforms.Compose([
-			transforms.Resize(int(image_size * 1.15)),
-			transforms.CenterCrop(image_size),
-			transforms.ToTensor(),
-			transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-		]),
-		transforms.Compose([
-			transforms.Resize(int(image_size * 1.15)),
-			transforms.CenterCrop(image_size),
-			transforms.RandomHorizontalFlip(p=1.0),
-			transforms.ToTensor(),
-			transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-		]),
-		transforms.Compose([
-			transforms.Resize(int(image_size * 1.15)),
-			transforms.CenterCrop(image_size),
-			transforms.ColorJitter(brightness=0.1, contrast=0.1),
-			transforms.ToTensor(),
-			transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-		]),
-	]
+	tta_transforms = build_tta_transforms(image_size)
 	
 	image = Image.open(image_path).convert("RGB")
 	
@@ -0,0 +1,135 @@
+import json
+
+import pytest
+import torch
+
+import evaluate
+from evaluate import _expected_calibration_error, stale_cache_reasons, sweep
+from tta import TTA_VIEW_NAMES, MIN_PROB, MIN_MARGIN, MAX_ENTROPY, is_non_cattle
+
+
+def _synthetic_cache(num_labeled: int = 150, num_negative: int = 50, num_classes: int = 5) -> dict:
+	generator = torch.Generator().manual_seed(0)
+	n = num_labeled + num_negative
+	logits = torch.randn(n, len(TTA_VIEW_NAMES), num_classes, generator=generator, dtype=torch.float64) * 2.0
+	targets = torch.randint(0, num_classes, (n,), generator=generator)
+	# Make most breed images confidently right so both accept and reject branches are exercised
+	logits[torch.arange(num_labeled), :, targets[:num_labeled]] += torch.rand(num_labeled, 1, generator=generator, dtype=torch.float64) * 6.0
+	targets[num_labeled:] = -1
+	return {"logits": logits, "targets": targets, "views": TTA_VIEW_NAMES}
+
+
+def _reference_stats(cache: dict, view_indices: list, temperature: float = 1.0) -> list:
+	"""Per-image (target, prediction, best_prob, margin, entropy) following api._predict_pil."""
+	stats = []
+	for logits, target in zip(cache["logits"], cache["targets"].tolist()):
+		probs = torch.mean(torch.stack([torch.softmax(logits[v] / temperature, dim=0) for v in view_indices], dim=0), dim=0)
+		label_probs = sorted(enumerate(probs.tolist()), key=lambda kv: kv[1], reverse=True)
+		best_prob = label_probs[0][1]
+		p = probs.clamp(min=1e-9)
+		stats.append((target, label_probs[0][0], best_prob, best_prob - label_probs[1][1], float(-torch.sum(p * torch.log(p)))))
+	return stats
+
+
+def _reference(stats: list, min_prob: float = MIN_PROB, min_margin: float = MIN_MARGIN, max_entropy: float = MAX_ENTROPY) -> dict:
+	"""Per-image loop applying the open-set rule with the given thresholds."""
+	accepted = accepted_correct = neg_rejected = 0
+	num_labeled = num_negative = 0
+	for target, pred, best_prob, margin, ent in stats:
+		rejected = is_non_cattle(best_prob, margin, ent, min_prob, min_margin, max_entropy)
+		if target < 0:
+			num_negative += 1
+			neg_rejected += int(rejected)
+		else:
+			num_labeled += 1
+			if not rejected:
+				accepted += 1
+				accepted_correct += int(pred == target)
+	return {
+		"open_set_accuracy": (accepted_correct + neg_rejected) / (num_labeled + num_negative),
+		"selective_accuracy": accepted_correct / max(accepted, 1),
+		"false_reject_rate": 1.0 - accepted / num_labeled,
+		"negative_reject_rate": neg_rejected / num_negative,
+	}
+
+
+def test_sweep_matches_per_image_rule_for_every_view_subset():
+	cache = _synthetic_cache()
+	results = sweep(cache, [1.0], [MIN_PROB], [MIN_MARGIN], [MAX_ENTROPY])
+	assert len(results) == 2 ** len(TTA_VIEW_NAMES) - 1
+	assert any(r["views"] == TTA_VIEW_NAMES for r in results)
+	for r in results:
+		expected = _reference(_reference_stats(cache, [TTA_VIEW_NAMES.index(v) for v in r["views"]]))
+		assert r["forward_passes"] == len(r["views"])
+		for key, value in expected.items():
+			assert r[key] == pytest.approx(value), (r["views"], key)
+
+
+def test_sweep_matches_per_image_rule_across_temperatures_and_thresholds():
+	cache = _synthetic_cache(num_labeled=60, num_negative=30)
+	# Different grid lengths per axis so a transposed broadcast cannot line up by accident
+	temperatures = [0.5, 2.0]
+	min_probs = [0.0, 0.4, 0.7]
+	min_margins = [0.0, 0.2]
+	max_entropies = [0.5, 1.0, 1.5, float("inf")]
+	results = sweep(cache, temperatures, min_probs, min_margins, max_entropies)
+	assert len(results) == len(temperatures) * (2 ** len(TTA_VIEW_NAMES) - 1) * len(min_probs) * len(min_margins) * len(max_entropies)
+	assert len({round(r["open_set_accuracy"], 6) for r in results}) > 1
+
+	stats_cache = {}
+	for r in results:
+		key = (r["temperature"], tuple(r["views"]))
+		if key not in stats_cache:
+			stats_cache[key] = _reference_stats(cache, [TTA_VIEW_NAMES.index(v) for v in r["views"]], r["temperature"])
+		max_entropy = float("inf") if r["max_entropy"] is None else r["max_entropy"]
+		expected = _reference(stats_cache[key], r["min_prob"], r["min_margin"], max_entropy)
+		for name, value in expected.items():
+			assert r[name] == pytest.approx(value), (key, r["min_prob"], r["min_margin"], r["max_entropy"], name)
+
+
+def test_sweep_reports_disabled_entropy_check_as_none():
+	results = sweep(_synthetic_cache(), [1.0], [0.0], [0.0], [float("inf")])
+	assert all(r["max_entropy"] is None for r in results)
+	assert all(r["false_reject_rate"] == pytest.approx(0.0) for r in results)
+
+
+def test_expected_calibration_error_known_value():
+	# 10 bins: 0.85 falls in (0.8, 0.9] with accuracy 1/2, 0.55 in (0.5, 0.6] with accuracy 2/2
+	confidence = torch.tensor([0.85, 0.85, 0.55, 0.55])
+	correct = torch.tensor([True, False, True, True])
+	# (|1.7 - 1| + |1.1 - 2|) / 4
+	assert float(_expected_calibration_error(confidence, correct, num_bins=10)) == pytest.approx(0.4)
+	batched = _expected_calibration_error(torch.stack([confidence, torch.ones(4)]), torch.stack([correct, torch.ones(4, dtype=torch.bool)]), num_bins=10)
+	assert batched.tolist() == pytest.approx([0.4, 0.0])
+
+
+def test_stale_cache_reasons_detects_changed_inputs(tmp_path, monkeypatch):
+	artifacts = tmp_path / "artifacts"
+	artifacts.mkdir()
+	(artifacts / "idx_to_class.json").write_text(json.dumps({"0": "Gir", "1": "Sahiwal"}), encoding="utf-8")
+	monkeypatch.setattr(evaluate, "ARTIFACTS_DIR", str(artifacts))
+	ckpt = tmp_path / "best_model.pt"
+	torch.save({"image_size": 224}, ckpt)
+	labeled = tmp_path / "holdout"
+	for name in ("Gir", "Sahiwal"):
+		(labeled / name).mkdir(parents=True)
+		(labeled / name / "a.jpg").write_bytes(b"")
+	samples = evaluate.collect_samples(str(labeled), "", {"0": "Gir", "1": "Sahiwal"})
+	cache = {
+		"targets": torch.tensor([t for _, t in samples]),
+		"paths": [p for p, _ in samples],
+		"views": TTA_VIEW_NAMES,
+		"idx_to_class": {"0": "Gir", "1": "Sahiwal"},
+		"image_size": 224,
+		"source": evaluate.cache_source(str(ckpt), str(labeled), ""),
+	}
+	assert stale_cache_reasons(cache, str(ckpt), str(labeled), "") == []
+
+	# Same folder paths, different images inside
+	(labeled / "Gir" / "b.jpg").write_bytes(b"")
+	assert stale_cache_reasons(cache, str(ckpt), str(labeled), "") == ["images"]
+	(labeled / "Gir" / "b.jpg").unlink()
+
+	assert stale_cache_reasons(dict(cache, views=["center"]), str(ckpt), str(labeled), "") == ["views"]
+	assert stale_cache_reasons(dict(cache, idx_to_class={"0": "Sahiwal", "1": "Gir"}), str(ckpt), str(labeled), "") == ["idx_to_class"]
+	assert stale_cache_reasons(dict(cache, image_size=256), str(ckpt), str(labeled), "") == ["image_size"]
@@ -0,0 +1,41 @@
+from typing import List
+
+from torchvision import transforms
+
+# Names of the TTA views returned by build_tta_transforms, in the same order
+TTA_VIEW_NAMES = ["center", "hflip", "jitter"]
+
+# Open-set rejection thresholds applied to the TTA-averaged probabilities
+MIN_PROB = 0.6
+MIN_MARGIN = 0.25
+MAX_ENTROPY = 1.5
+
+
+def build_tta_transforms(image_size: int) -> List[transforms.Compose]:
+	return [
+		transforms.Compose([
+			transforms.Resize(int(image_size * 1.15)),
+			transforms.CenterCrop(image_size),
+			transforms.ToTensor(),
+			transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+		]),
+		transforms.Compose([
+			transforms.Resize(int(image_size * 1.15)),
+			transforms.CenterCrop(image_size),
+			transforms.RandomHorizontalFlip(p=1.0),
+			transforms.ToTensor(),
+			transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+		]),
+		transforms.Compose([
+			transforms.Resize(int(image_size * 1.15)),
+			transforms.CenterCrop(image_size),
+			transforms.ColorJitter(brightness=0.1, contrast=0.1),
+			transforms.ToTensor(),
+			transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+		]),
+	]
+
+
+def is_non_cattle(best_prob: float, margin: float, ent: float, min_prob: float = MIN_PROB, min_margin: float = MIN_MARGIN, max_entropy: float = MAX_ENTROPY) -> bool:
+	# Heuristics tuned for open-set rejection: low top-1, small top-1 margin or high entropy
+	return (best_prob < min_prob) or (margin < min_margin) or (ent > max_entropy)